@@ -1,6 +1,25 @@
 import requests, sys, os, re
+import numpy as np
+from PIL import Image
 from tqdm import tqdm
 
+# Maximum number of differing dHash bits (out of 64) for two backdrops to count as near-duplicates.
+# Recompressed copies and crops of up to ~4% per side stay within 12 bits, while unrelated
+# frames are usually 17+ apart. Crops of 5% or more are not reliably caught.
+DUPLICATE_THRESHOLD = 12
+# Normalised 16x16 thumbnails must also correlate at least this strongly, which rules out
+# different images whose coarse gradients happen to line up. Crops of up to ~4% per side
+# stay above 0.89, unrelated frames below 0.7.
+MIN_CORRELATION = 0.85
+# Thumbnails with less grey-level spread than this are treated as flat and never deduplicated
+FLAT_STD = 8
+HASH_SIZE = 8
+THUMB_SIZE = 16
+# Set to False to download without the near-duplicate check
+CHECK_DUPLICATES = True
+
+_hash_indexes = {}
+
 def get_api_key():
     try:
         with open('key.txt', 'r') as file:
@@ -69,7 +88,11 @@ def get_tmdb_backdrops(api_key, media_id, media_type):
         print(f"Unexpected error getting backdrops: {e}")
     return []
 
-def download_image(url, file_name):
+def download_image(url, file_name, hash_index=None):
+    if not os.path.splitext(file_name)[1]:
+        file_name += '.jpg'
+    # Download next to the target so a rejected file never touches an existing copy
+    temp_name = f"{file_name}.part"
     try:
         response = requests.get(url, stream=True)
         response.raise_for_status()
@@ -78,10 +101,7 @@ def download_image(url, file_name):
         block_size = 1024
 
         if response.status_code == 200:
-            if not file_name.lower().endswith('.jpg'):
-                file_name += '.jpg'
-            
-            with open(file_name, 'wb') as file, tqdm(
+            with open(temp_name, 'wb') as file, tqdm(
                 desc=file_name,
                 total=total_size,
                 unit='iB',
@@ -91,7 +111,32 @@ def download_image(url, file_name):
                 for chunk in response.iter_content(block_size):
                     file.write(chunk)
                     bar.update(len(chunk))
+
+            if not verify_image(temp_name):
+                print(f"\nError: {file_name} is not a valid image. Discarding the download.")
+                return None
+
+            fingerprint = None
+            if hash_index is not None:
+                try:
+                    fingerprint = image_fingerprint(temp_name)
+                except (OSError, Image.DecompressionBombError) as e:
+                    print(f"\nError decoding {file_name} for duplicate check, keeping it unchecked: {e}")
+            if fingerprint is not None:
+                # A re-download replaces the file of the same name, so never compare against it
+                duplicate = find_near_duplicate(fingerprint, hash_index, exclude=os.path.basename(file_name))
+                if duplicate:
+                    print(f"\n{file_name} looks like a near-duplicate of {duplicate}.")
+                    keep = input("Keep it anyway? (y/n): ").strip().lower()
+                    if keep != 'y':
+                        print("Download skipped.")
+                        return None
+
+            os.replace(temp_name, file_name)
+            if fingerprint is not None:
+                add_to_hash_index(hash_index, os.path.basename(file_name), fingerprint)
             print(f"\nImage downloaded: {file_name}")
+            return file_name
         else:
             print(f"Failed to download image: {response.status_code}")
     except requests.exceptions.RequestException as e:
@@ -101,6 +146,104 @@ def download_image(url, file_name):
         print("Make sure you have write permissions in the current directory.")
     except Exception as e:
         print(f"Unexpected error during image download: {e}")
+    finally:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+    return None
+
+def verify_image(file_name):
+    try:
+        with Image.open(file_name) as img:
+            img.verify()
+        # verify() does not decode pixel data, so reopen and load to catch truncated files
+        with Image.open(file_name) as img:
+            img.load()
+        return True
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        print(f"Error verifying image: {e}")
+        return False
+
+def image_fingerprint(file_name, hash_size=HASH_SIZE, thumb_size=THUMB_SIZE):
+    with Image.open(file_name) as img:
+        # Let the JPEG decoder downscale while decoding; both signatures only need a tiny thumbnail
+        img.draft('L', (thumb_size * 4, thumb_size * 4))
+        grey = img.convert('L')
+        hash_pixels = np.asarray(grey.resize((hash_size + 1, hash_size), Image.LANCZOS), dtype=np.int16)
+        thumb = np.asarray(grey.resize((thumb_size, thumb_size), Image.LANCZOS), dtype=np.float32).flatten()
+
+    # Difference hash: compare neighbouring pixels of the greyscale thumbnail
+    bits = (hash_pixels[:, 1:] > hash_pixels[:, :-1]).flatten()
+
+    # Normalised thumbnail for the correlation check. Near-flat frames (mostly black backdrops,
+    # plain title cards) get an all-zero vector, so they never correlate with anything.
+    std = thumb.std()
+    if std < FLAT_STD:
+        thumb = np.zeros_like(thumb)
+    else:
+        thumb = (thumb - thumb.mean()) / std
+    return bits, thumb
+
+def build_hash_index(prefix, directory='.'):
+    index = {
+        'directory': directory,
+        'names': [],
+        'hashes': np.empty((0, HASH_SIZE * HASH_SIZE), dtype=bool),
+        'thumbs': np.empty((0, THUMB_SIZE * THUMB_SIZE), dtype=np.float32),
+    }
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.startswith(prefix) or name.endswith('.part') or not os.path.isfile(path):
+            continue
+        try:
+            fingerprint = image_fingerprint(path)
+        except (OSError, Image.DecompressionBombError) as e:
+            print(f"Error reading {name} for duplicate check, skipping it: {e}")
+            continue
+        add_to_hash_index(index, name, fingerprint)
+    return index
+
+def get_hash_index(prefix, directory='.'):
+    # Each title's index is built from disk once per session and kept up to date by download_image
+    key = (os.path.abspath(directory), prefix)
+    if key not in _hash_indexes:
+        _hash_indexes[key] = build_hash_index(prefix, directory)
+    return _hash_indexes[key]
+
+def add_to_hash_index(index, name, fingerprint):
+    bits, thumb = fingerprint
+    if name in index['names']:
+        # Re-downloaded file replaced an existing one
+        position = index['names'].index(name)
+        index['hashes'][position] = bits
+        index['thumbs'][position] = thumb
+    else:
+        index['names'].append(name)
+        index['hashes'] = np.vstack([index['hashes'], bits])
+        index['thumbs'] = np.vstack([index['thumbs'], thumb])
+
+def remove_stale_entries(index):
+    # Files deleted from disk since the index was built must not be reported as duplicates
+    present = np.array([os.path.isfile(os.path.join(index['directory'], name)) for name in index['names']], dtype=bool)
+    if all(present):
+        return
+    index['names'] = [name for name, keep in zip(index['names'], present) if keep]
+    index['hashes'] = index['hashes'][present]
+    index['thumbs'] = index['thumbs'][present]
+
+def find_near_duplicate(fingerprint, index, threshold=DUPLICATE_THRESHOLD, exclude=None):
+    remove_stale_entries(index)
+    if not index['names']:
+        return None
+    bits, thumb = fingerprint
+    distances = np.count_nonzero(index['hashes'] != bits, axis=1)
+    correlations = index['thumbs'] @ thumb / thumb.size
+    matches = (distances <= threshold) & (correlations >= MIN_CORRELATION)
+    if exclude is not None:
+        matches &= np.array([name != exclude for name in index['names']])
+    if not matches.any():
+        return None
+    closest = int(np.argmin(np.where(matches, distances, bits.size + 1)))
+    return index['names'][closest]
 
 def sanitize_file_name(name):
     sanitized = re.sub(r'[<>:"/\\|?*\[\]()]', '', name)
@@ -159,7 +302,8 @@ def main():
                                 for idx, backdrop in enumerate(backdrops, start=1):
                                     width = backdrop.get('width', 'N/A')
                                     height = backdrop.get('height', 'N/A')
-                                    file_name = f"{media_title.replace(' ', '_')}_backdrop_{idx}.jpg"
+                                    extension = os.path.splitext(backdrop.get('file_path', ''))[1] or '.jpg'
+                                    file_name = f"{media_title.replace(' ', '_')}_backdrop_{idx}{extension}"
                                     print(f"{idx}. {file_name}: Size: {width}x{height}")
                                 
                                 while True:
@@ -170,12 +314,13 @@ def main():
                                             selected_backdrop = backdrops[backdrop_choice - 1]
                                             backdrop_url = f"https://image.tmdb.org/t/p/original{selected_backdrop['file_path']}"
                                             
-                                            file_name = f"{media_title.replace(' ', '_')}_backdrop_{backdrop_choice}"
-                                            file_name = sanitize_file_name(file_name)
-                                            if not file_name.lower().endswith('.jpg'):
-                                                file_name += '.jpg'
+                                            # Keep the extension TMDB serves; some originals are PNG
+                                            extension = os.path.splitext(selected_backdrop['file_path'])[1] or '.jpg'
+                                            file_prefix = f"{media_title.replace(' ', '_')}_backdrop_"
+                                            file_name = sanitize_file_name(f"{file_prefix}{backdrop_choice}") + extension
                                             
-                                            download_image(backdrop_url, file_name)
+                                            hash_index = get_hash_index(file_prefix) if CHECK_DUPLICATES else None
+                                            download_image(backdrop_url, file_name, hash_index)
                                             break
                                         else:
                                             print("Invalid selection. Please choose a number from the list.")
@@ -0,0 +1,134 @@
+import io, os, sys
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+PREFIX = 'Test_backdrop_'
+
+def make_scene(seed, size=(1280, 720)):
+    rng = np.random.default_rng(seed)
+    img = Image.new('RGB', size, tuple(int(c) for c in rng.integers(0, 256, 3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.integers(0, size[0]), rng.integers(0, size[1])
+        x1, y1 = x0 + rng.integers(100, 500), y0 + rng.integers(100, 400)
+        draw.ellipse([x0, y0, x1, y1], fill=tuple(int(c) for c in rng.integers(0, 256, 3)))
+    return img
+
+def save(img, path, **kwargs):
+    img.save(path, 'JPEG', **kwargs)
+    return str(path)
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, block_size):
+        yield self.content
+
+def serve(monkeypatch, content):
+    monkeypatch.setattr(main.requests, 'get', lambda url, stream: FakeResponse(content))
+
+def jpeg_bytes(img):
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+def refuse_prompt(prompt):
+    raise AssertionError(f"Unexpected prompt: {prompt}")
+
+def duplicate_of(path, directory):
+    index = main.build_hash_index(PREFIX, directory)
+    return main.find_near_duplicate(main.image_fingerprint(path), index)
+
+def test_verify_image_valid_and_truncated(tmp_path):
+    good = save(make_scene(1), tmp_path / 'good.jpg', quality=90)
+    truncated = tmp_path / 'truncated.jpg'
+    with open(good, 'rb') as file:
+        truncated.write_bytes(file.read()[:5000])
+
+    assert main.verify_image(good)
+    assert not main.verify_image(str(truncated))
+
+def test_recompressed_and_cropped_copies_are_duplicates(tmp_path):
+    scene = make_scene(2)
+    save(scene, tmp_path / f'{PREFIX}1.jpg', quality=95)
+
+    recompressed = save(scene, tmp_path / 'recompressed.jpg', quality=40)
+    cropped = scene.crop((20, 12, 1260, 708)).resize(scene.size)
+    cropped = save(cropped, tmp_path / 'cropped.jpg', quality=85)
+    # 4% off each side
+    cropped_more = scene.crop((51, 29, 1229, 691)).resize(scene.size)
+    cropped_more = save(cropped_more, tmp_path / 'cropped_more.jpg', quality=85)
+
+    assert duplicate_of(recompressed, tmp_path) == f'{PREFIX}1.jpg'
+    assert duplicate_of(cropped, tmp_path) == f'{PREFIX}1.jpg'
+    assert duplicate_of(cropped_more, tmp_path) == f'{PREFIX}1.jpg'
+
+def test_distinct_images_are_not_duplicates(tmp_path):
+    save(make_scene(3), tmp_path / f'{PREFIX}1.jpg')
+    other = save(make_scene(4), tmp_path / 'other.jpg')
+    assert duplicate_of(other, tmp_path) is None
+
+def test_dark_frames_are_not_duplicates(tmp_path):
+    dark1 = Image.new('L', (1280, 720), 0)
+    dark1.paste(5, (0, 0, 640, 720))
+    save(dark1.convert('RGB'), tmp_path / f'{PREFIX}1.jpg')
+
+    dark2 = Image.new('L', (1280, 720), 0)
+    dark2.paste(255, (600, 300, 700, 400))
+    dark2 = save(dark2.convert('RGB'), tmp_path / 'dark2.jpg')
+
+    assert duplicate_of(dark2, tmp_path) is None
+
+def test_failed_verification_keeps_existing_file(tmp_path, monkeypatch):
+    existing = save(make_scene(5), tmp_path / f'{PREFIX}1.jpg')
+    with open(existing, 'rb') as file:
+        original = file.read()
+
+    serve(monkeypatch, b'not an image')
+    index = main.build_hash_index(PREFIX, tmp_path)
+
+    assert main.download_image('https://example.invalid/x.jpg', existing, index) is None
+    with open(existing, 'rb') as file:
+        assert file.read() == original
+    assert os.listdir(tmp_path) == [f'{PREFIX}1.jpg']
+
+def test_deleted_file_is_not_reported_as_duplicate(tmp_path, monkeypatch):
+    scene = make_scene(6)
+    first = save(scene, tmp_path / f'{PREFIX}1.jpg')
+    index = main.build_hash_index(PREFIX, tmp_path)
+    os.remove(first)
+
+    serve(monkeypatch, jpeg_bytes(scene))
+    monkeypatch.setattr('builtins.input', refuse_prompt)
+    second = str(tmp_path / f'{PREFIX}2.jpg')
+
+    assert main.download_image('https://example.invalid/x.jpg', second, index) == second
+    assert index['names'] == [f'{PREFIX}2.jpg']
+
+def test_redownload_is_not_compared_with_file_it_replaces(tmp_path, monkeypatch):
+    scene = make_scene(7)
+    existing = save(scene, tmp_path / f'{PREFIX}1.jpg')
+    index = main.build_hash_index(PREFIX, tmp_path)
+
+    serve(monkeypatch, jpeg_bytes(scene))
+    monkeypatch.setattr('builtins.input', refuse_prompt)
+
+    assert main.download_image('https://example.invalid/x.jpg', existing, index) == existing
+    assert index['names'] == [f'{PREFIX}1.jpg']
+
+def test_oversized_file_is_skipped_when_building_index(tmp_path, monkeypatch):
+    save(make_scene(8), tmp_path / f'{PREFIX}1.jpg')
+    monkeypatch.setattr(main.Image, 'MAX_IMAGE_PIXELS', 1000)
+
+    assert main.build_hash_index(PREFIX, tmp_path)['names'] == []